@@ -7,6 +7,7 @@ import itertools
 import math
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
+from collections import deque
 import tempfile
 import time
 import sys
@@ -390,7 +391,7 @@ class BaseModel(object, metaclass=ABCMeta):
         self._to_pull = 0
         while not self._closed:
             try:
-                example = self._data.pop(0)
+                example = self._data.popleft()
 
                 # Ensure examples used for padding match expected input format
                 if isinstance(example, str):
@@ -421,7 +422,7 @@ class BaseModel(object, metaclass=ABCMeta):
         """
         Ensure graph is not rebuilt on subsequent calls to .predict()
         """
-        self._data = Xs
+        self._data = deque(Xs)
         self._closed = False
         n = n_examples or len(self._data)
         if self._predictions is None:
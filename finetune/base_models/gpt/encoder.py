@@ -6,6 +6,7 @@ import json
 import os
 import warnings
 import codecs
+import functools
 
 import numpy as np
 from ftfy.fixes import uncurl_quotes
@@ -20,6 +21,11 @@ VOCAB_PATH = os.path.join(FINETUNE_FOLDER, "model", "gpt", "vocab.bpe")
 SUBS = {"—": "-", "–": "-", "―": "-", "…": "...", "´": "'"}
 
 
+@functools.lru_cache(maxsize=None)
+def _bpe_token_length(token):
+    return len(token.strip().replace("</w>", ""))
+
+
 def _text_standardize(text):
     """
     Fixes some issues the spacy tokenizer had on books corpus
@@ -75,7 +81,7 @@ class GPTEncoder(BaseEncoder):
         self.initialized = True
 
     def _token_length(self, token):
-        return len(token.strip().replace("</w>", ""))
+        return _bpe_token_length(token)
 
     def bpe(self, token):
         word = tuple(token[:-1]) + (token[-1] + "</w>",)
@@ -168,7 +174,7 @@ class GPTEncoder(BaseEncoder):
                     token.text.replace(" ", "")
                 )
 
-                token_char_ends = np.cumsum([len(tok.strip().replace("</w>", "")) for tok in bpe_toks]) + token_start
+                token_char_ends = np.cumsum([_bpe_token_length(tok) for tok in bpe_toks]) + token_start
                 token_char_starts = [token_start] + token_char_ends[:-1].tolist()
                 token_start += len(token.text.strip())
                 char_ends.extend(token_char_ends)
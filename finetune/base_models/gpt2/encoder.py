@@ -40,6 +40,11 @@ def bytes_to_unicode():
     return dict(zip(bs, cs))
 
 
+@lru_cache(maxsize=None)
+def _byte_token_length(token):
+    return len(token.strip())
+
+
 class GPT2Encoder(BaseEncoder):
     """
     A modified wrapper for a public python BPE tokenizer. The modifications allow encoding directly into the formats
@@ -195,7 +200,7 @@ class GPT2Encoder(BaseEncoder):
                 lens = [None for _ in bpe_toks]
                 
                 for i, tok in enumerate(decoded_bpe_toks):
-                    lens[i] = len(tok.strip())
+                    lens[i] = _byte_token_length(tok)
                     
                 token_char_ends = np.cumsum(lens) + token_start
                 
@@ -1,27 +1,32 @@
 import warnings
+import operator
+from collections import defaultdict
 
 import numpy as np
 
 from finetune.encoding.input_encoder import NLP
 
+SPACY_BATCH_SIZE = 64
+
 
 def assign_associations(associations, none_value, idx_lookup):
-    candidates = dict()
-    for association in associations:
-        for bpe_idx, candidate_idx, candidate_label, candidate_prob in association:
-            if candidate_label == none_value:
-                continue
-            if idx_lookup[bpe_idx] not in candidates:
-                candidates[idx_lookup[bpe_idx]] = []
-            candidates[idx_lookup[bpe_idx]].append(
-                (idx_lookup[candidate_idx], candidate_label, candidate_prob)
-            )
+    rows = [
+        (idx_lookup[bpe_idx], (idx_lookup[candidate_idx], candidate_label, candidate_prob))
+        for association in associations
+        for bpe_idx, candidate_idx, candidate_label, candidate_prob in association
+        if candidate_label != none_value
+    ]
+    if not rows:
+        return dict()
 
     # TODO some how sample these candidates eg maximum probabilities, to fit some schema
-    candidates = {
-        k: max(v, key=lambda x: x[2]) for k, v in candidates.items()
-    }  # for now just pick maximum prob
-    return candidates
+    # for now just pick maximum prob: sort by key then by descending prob and keep the first row
+    # of each key. lexsort is stable, so ties go to the earliest candidate.
+    keys = np.asarray([key for key, _ in rows])
+    probs = np.asarray([candidate[2] for _, candidate in rows], dtype=np.float64)
+    order = np.lexsort((-probs, keys))
+    _, first_of_key = np.unique(keys[order], return_index=True)
+    return {rows[i][0]: rows[i][1] for i in order[first_of_key]}
 
 
 def _merge_confidences(annotation):
@@ -40,15 +45,29 @@ def _merge_confidences(annotation):
     }
 
 
+def _nearest_idx(sorted_values, value):
+    # Index of the element of `sorted_values` closest to `value`, preferring the earliest on ties.
+    # Assumes `sorted_values` is strictly increasing, as spaCy token starts and ends are.
+    idx = int(np.searchsorted(sorted_values, value, side="left"))
+    if idx == len(sorted_values) or (
+        idx > 0 and value - sorted_values[idx - 1] <= sorted_values[idx] - value
+    ):
+        idx -= 1
+    return idx
+
+
 def round_to_nearest_start_and_end(label, token_starts, token_ends, text):
     # Update label start / end / text to align with nearest token start_token and end
     # Applies in-place modification to `label` obj.
-    end_distances = np.abs(np.asarray(token_ends) - label["end"])
-    label["end"] = token_ends[np.argmin(end_distances)]
+    # token_starts and token_ends are both sorted, so binary search in place of a linear scan.
+    token_starts = np.asarray(token_starts)
+    token_ends = np.asarray(token_ends)
+    label["end"] = int(token_ends[_nearest_idx(token_ends, label["end"])])
 
-    token_starts = [s for s in token_starts if s < label["end"]]  # label cannot end before it starts
-    start_distances = np.abs(np.asarray(token_starts) - label["start"])
-    label["start"] = token_starts[np.argmin(start_distances)]
+    # label cannot end before it starts
+    n_valid_starts = int(np.searchsorted(token_starts, label["end"], side="left"))
+    token_starts = token_starts[:n_valid_starts]
+    label["start"] = int(token_starts[_nearest_idx(token_starts, label["start"])])
 
     label["text"] = text[label["start"] : label["end"]]
 
@@ -89,14 +108,26 @@ def finetune_to_indico_sequence(
     :return: Texts, annoatations both in the 'indico' format.
     """
     annotations = []
-    loop_vals = zip(raw_texts, subseqs, labels, probs or [None] * len(raw_texts))
-    for doc_idx, (raw_text, doc_seq, label_seq, prob_seq) in enumerate(loop_vals):
-        spacy_tokens = NLP(raw_text)
-        spacy_token_starts = [token.idx for token in spacy_tokens]
-        spacy_token_ends = [token.idx + len(token.text) for token in spacy_tokens]
+    spacy_docs = NLP.pipe(raw_texts, batch_size=SPACY_BATCH_SIZE)
+    loop_vals = zip(
+        raw_texts, spacy_docs, subseqs, labels, probs or [None] * len(raw_texts)
+    )
+    for doc_idx, (raw_text, spacy_tokens, doc_seq, label_seq, prob_seq) in enumerate(
+        loop_vals
+    ):
+        spacy_token_starts = np.asarray(
+            [token.idx for token in spacy_tokens], dtype=np.int32
+        )
+        spacy_token_ends = spacy_token_starts + np.asarray(
+            [len(token.text) for token in spacy_tokens], dtype=np.int32
+        )
         doc_annotations = []
+        # same annotations as doc_annotations, indexed by label so that extending an
+        # existing annotation only scans candidates that could possibly match
+        annotations_by_label = defaultdict(list)
         annotation_ranges = set()
-        raw_annotation_start = 0
+        # subsequences appear in order, so each search resumes from the end of the last match
+        search_start = 0
         subtoken_to_label_idx = []
         for i, (sub_str, raw_label, confidences) in enumerate(
             zip(doc_seq, label_seq, prob_seq or [None] * len(doc_seq))
@@ -107,34 +138,25 @@ def finetune_to_indico_sequence(
             else:
                 label_list = raw_label
 
-            for label_idx, label in enumerate(label_list):
-                stripped_text = sub_str.strip()
-
-                if subtoken_predictions:
-                    raw_annotation_start = raw_text.find(sub_str, raw_annotation_start)
-                    raw_annotation_end = raw_annotation_start + len(sub_str)
-                else:
-                    raw_annotation_start = raw_text.find(
-                        stripped_text, raw_annotation_start
-                    )
-                    raw_annotation_end = raw_annotation_start + len(stripped_text)
-
-                if raw_annotation_start == -1:
-                    warnings.warn(
-                        "Failed to find predicted sequence: {} in text".format(
-                            sub_str
-                        )
-                    )
-                    continue
+            # the location of the subsequence does not depend on the label, so find it once
+            search_text = sub_str if subtoken_predictions else sub_str.strip()
+            raw_annotation_start = raw_text.find(search_text, search_start)
+            if raw_annotation_start == -1:
+                warnings.warn(
+                    "Failed to find predicted sequence: {} in text".format(sub_str)
+                )
+                continue
+            raw_annotation_end = raw_annotation_start + len(search_text)
+            search_start = raw_annotation_end
+            token_span = None
 
+            for label in label_list:
                 extended_existing_label = False
-                for item in doc_annotations:
-                    # handle case where we extend existing annotation
+                for item in annotations_by_label[label]:
+                    # handle case where we extend existing annotation with the same label
                     if (
-                        # same label
-                        item["label"] == label
-                        # and only separated by whitespace
-                        and item["end"] <= raw_annotation_end
+                        # only separated by whitespace
+                        item["end"] <= raw_annotation_end
                         and not raw_text[item["end"]: raw_annotation_start].strip()
                     ):
                         item["end"] = raw_annotation_end
@@ -147,25 +169,25 @@ def finetune_to_indico_sequence(
                 if extended_existing_label or label == none_value:
                     continue
 
-                annotation_start, annotation_end = (
-                    int(raw_annotation_start),
-                    int(raw_annotation_end),
-                )
+                if token_span is None:
+                    token_span = {
+                        "start": int(raw_annotation_start),
+                        "end": int(raw_annotation_end),
+                    }
+                    # if we don't want to allow subtoken predictions, adjust start and end to match
+                    # the start and ends of the nearest full tokens
+                    if not subtoken_predictions:
+                        round_to_nearest_start_and_end(
+                            token_span, spacy_token_starts, spacy_token_ends, raw_text
+                        )
 
                 annotation = {
-                    "start": int(annotation_start),
-                    "end": int(annotation_end),
+                    "start": token_span["start"],
+                    "end": token_span["end"],
                     "label": label,
-                    "text": raw_text[annotation_start:annotation_end],
+                    "text": raw_text[token_span["start"]:token_span["end"]],
                 }
 
-                # if we don't want to allow subtoken predictions, adjust start and end to match
-                # the start and ends of the nearest full tokens
-                if not subtoken_predictions:
-                    round_to_nearest_start_and_end(
-                        annotation, spacy_token_starts, spacy_token_ends, raw_text
-                    )
-
                 if confidences is not None:
                     annotation["confidence"] = [confidences]
 
@@ -177,6 +199,7 @@ def finetune_to_indico_sequence(
                 if annotation_tuple not in annotation_ranges:
                     annotation_ranges.add(annotation_tuple)
                     doc_annotations.append(annotation)
+                    annotations_by_label[label].append(annotation)
 
         if associations:
             associations_seq = assign_associations(
@@ -191,9 +214,7 @@ def finetune_to_indico_sequence(
                         "prob": prob,
                     }
 
-        doc_annotations = sorted(
-            [dict(items) for items in doc_annotations], key=lambda x: span(x)
-        )
+        doc_annotations.sort(key=operator.itemgetter("start", "end"))
 
         for annotation in doc_annotations:
             _merge_confidences(annotation)
@@ -15,7 +15,7 @@ def embed_context(context, featurizer_state, config, train):
             shape=[config.n_context_embed],	
             initializer=tf.zeros_initializer(),	
         )
-        c_embed = tf.add(tf.multiply(context, context_weight), context_bias)
+        c_embed = tf.tensordot(context, context_weight, axes=1) + context_bias
     featurizer_state['context'] = c_embed
     return featurizer_state
 
@@ -34,21 +34,24 @@ def add_context_embed(featurizer_state):
         else:
             flat_embed = context_embed
 
-        seq_mask = tf.sequence_mask(featurizer_state['lengths'])
+        float_mask = tf.sequence_mask(
+            featurizer_state['lengths'],
+            maxlen=shape_list(flat_embed)[1],
+            dtype=tf.float32,
+        )
+        # mean of the context embedding over the valid (unpadded) positions of each sequence
+        mean_context = tf.math.divide_no_nan(
+            tf.reduce_sum(flat_embed * tf.expand_dims(float_mask, -1), 1),
+            tf.reduce_sum(float_mask, 1, keepdims=True),
+        )
+        if len(shape) == 4:
+            mean_context = tf.reshape(
+                mean_context,
+                [shape[0], shape[1], shape[3]]
+            )
+
         for key in ['features', 'explain_out']:
             if key in featurizer_state:
-                float_mask = tf.cast(seq_mask, tf.float32)
-                binary_mask = tf.constant(1.) - float_mask
-                flat_embed = flat_embed * tf.expand_dims(binary_mask, -1)
-                sum_context = tf.reduce_sum(flat_embed, 1)
-                mean_context = sum_context / tf.reduce_sum(float_mask)
-
-                if len(shape) == 4:
-                    mean_context = tf.reshape(
-                        mean_context, 
-                        [shape[0], shape[1], shape[3]]
-                    )
-    
                 featurizer_state[key] = tf.concat(
                     (featurizer_state[key], mean_context), -1
                 )
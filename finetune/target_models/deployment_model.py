@@ -4,7 +4,7 @@ import itertools
 import logging
 import pandas as pd
 import tensorflow as tf
-from collections import namedtuple
+from collections import namedtuple, deque
 from tensorflow.python.data import Dataset
 
 from finetune.saver import InitializeHook
@@ -293,7 +293,7 @@ class DeploymentModel(BaseModel):
         update_hook=None
     ):
         Xs = self.input_pipeline._format_for_inference(Xs)
-        self._data = Xs
+        self._data = deque(Xs)
         self._closed = False
         n = n_examples or len(self._data)
         if self.adapters:
@@ -22,6 +22,7 @@ from finetune.util.metrics import (
 )
 from finetune.datasets.reuters import Reuters
 from finetune.encoding.input_encoder import tokenize_context, ArrayEncodedOutput
+from finetune.nn.auxiliary import embed_context, add_context_embed
 
 
 # prevent excessive warning logs
@@ -63,6 +64,63 @@ class TestAuxiliaryTokenization(unittest.TestCase):
         ]
         np.testing.assert_array_equal(expected, expanded_context)
 
+class TestContextEmbedGraph(unittest.TestCase):
+    n_features = 5
+
+    def _masked_mean(self, context, lengths):
+        return np.stack([c[:l].mean(axis=0) for c, l in zip(context, lengths)])
+
+    def _run_add_context_embed(self, context, lengths, features_shape):
+        with tf.Graph().as_default():
+            featurizer_state = {
+                "context": tf.constant(context),
+                "lengths": tf.constant(lengths),
+                "features": tf.zeros(features_shape),
+                "sequence_features": tf.zeros(context.shape[:-1] + (self.n_features,)),
+            }
+            add_context_embed(featurizer_state)
+            with tf.Session() as sess:
+                return sess.run(
+                    [featurizer_state["features"], featurizer_state["sequence_features"]]
+                )
+
+    def test_mean_context_ignores_padding(self):
+        context = np.random.rand(3, 4, 2).astype(np.float32)
+        lengths = np.array([1, 4, 2], dtype=np.int32)
+        features, sequence_features = self._run_add_context_embed(
+            context, lengths, [3, self.n_features]
+        )
+        np.testing.assert_allclose(
+            features[:, self.n_features:], self._masked_mean(context, lengths), rtol=1e-5
+        )
+        np.testing.assert_allclose(sequence_features[..., self.n_features:], context)
+
+    def test_mean_context_comparison(self):
+        # lengths are flattened over the batch and pair dimensions and may all be shorter than the padded sequence
+        context = np.random.rand(2, 2, 4, 2).astype(np.float32)
+        lengths = np.array([1, 3, 2, 3], dtype=np.int32)
+        features, _ = self._run_add_context_embed(
+            context, lengths, [2, 2, self.n_features]
+        )
+        expected = self._masked_mean(context.reshape(4, 4, 2), lengths).reshape(2, 2, 2)
+        np.testing.assert_allclose(features[..., self.n_features:], expected, rtol=1e-5)
+
+    def test_embed_context_projection(self):
+        context = np.random.rand(2, 3, 4).astype(np.float32)
+        config = get_config(n_context_embed=6)
+        with tf.Graph().as_default():
+            featurizer_state = embed_context(tf.constant(context), {}, config, train=False)
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                c_embed, weight, bias = sess.run([
+                    featurizer_state["context"],
+                    tf.get_default_graph().get_tensor_by_name("context_embedding/ce:0"),
+                    tf.get_default_graph().get_tensor_by_name("context_embedding/ca:0"),
+                ])
+        self.assertEqual(c_embed.shape, (2, 3, 6))
+        np.testing.assert_allclose(c_embed, np.dot(context, weight) + bias, rtol=1e-5)
+
+
 class TestAuxiliary(unittest.TestCase):
     base_model = GPT
     default_context = {"token": "", "pos": "filler", "capitalized": "False"}
@@ -1,7 +1,9 @@
 import os
 import unittest
 import warnings
+from collections import deque
 from pathlib import Path
+from types import SimpleNamespace
 
 # prevent excessive warning logs 
 warnings.filterwarnings('ignore')
@@ -12,6 +14,7 @@ import pandas as pd
 import numpy as np
 
 from finetune import MultiFieldClassifier, MultiFieldRegressor, Regressor
+from finetune.base import BaseModel
 from finetune.config import get_config
 from finetune.datasets import generic_download
 
@@ -120,3 +123,28 @@ class TestModel(unittest.TestCase):
         self.assertIsInstance(preds, list)
         self.assertIsInstance(preds[0], list)
         self.assertIsInstance(preds[0][0], (float, np.float32))
+
+
+class TestDataGenerator(unittest.TestCase):
+
+    def _pull(self, data, n):
+        # _data_generator only relies on _data and _closed being set
+        model = SimpleNamespace(_data=data, _closed=False)
+        gen = BaseModel._data_generator(model)
+        return [next(gen) for _ in range(n)], model
+
+    def test_pads_with_cached_example(self):
+        """
+        Ensure the prediction generator feeds a deque of examples (as assigned by _cached_inference and
+        DeploymentModel._inference) in order, then pads with blank examples and counts them
+        """
+        Xs = ["first example", "second example"]
+        examples, model = self._pull(deque(Xs), 4)
+        self.assertEqual(examples, ["first example", "second example", "", ""])
+        self.assertEqual(model._to_pull, 2)
+        self.assertEqual(Xs, ["first example", "second example"])
+
+    def test_multifield_padding(self):
+        examples, model = self._pull(deque([["a", "b"]]), 2)
+        self.assertEqual(examples, [["a", "b"], ["", ""]])
+        self.assertEqual(model._to_pull, 1)
@@ -149,7 +149,38 @@ class TestFinetuneIndicoConverters(unittest.TestCase):
         indicox_pred, indicoy_pred = finetune_to_indico_sequence(expectedx, finetunex, finetuney, none_value="<PAD>", subtoken_predictions=False)
         self.assertEqual(indicox_pred, expectedx)
         self.assertEqual(indicoy_pred, expectedy)
-        
+
+    def test_repeated_substrings(self):
+        # Each subsequence must be located after the previous one, even when its text also appears earlier
+        raw = ["the cat the cat the dog"]
+        finetunex = [["the cat", " the cat", " missing", " the dog"]]
+        finetuney = [["A", "B", "A", "C"]]
+        expectedy = [
+            [
+                {'start': 0, 'end': 7, 'label': "A", 'text': "the cat"},
+                {'start': 8, 'end': 15, 'label': "B", 'text': "the cat"},
+                {'start': 16, 'end': 23, 'label': "C", 'text': "the dog"},
+            ]
+        ]
+        with self.assertWarns(UserWarning):
+            indicox_pred, indicoy_pred = finetune_to_indico_sequence(raw, finetunex, finetuney, none_value="<PAD>", subtoken_predictions=False)
+        self.assertEqual(indicox_pred, raw)
+        self.assertEqual(indicoy_pred, expectedy)
+
+        # The same holds when labels keep subtoken boundaries
+        finetunex = [["ab", "ab", "zz", "ab"]]
+        finetuney = [["A", "B", "A", "C"]]
+        expectedy = [
+            [
+                {'start': 0, 'end': 2, 'label': "A", 'text': "ab"},
+                {'start': 2, 'end': 4, 'label': "B", 'text': "ab"},
+                {'start': 4, 'end': 6, 'label': "C", 'text': "ab"},
+            ]
+        ]
+        with self.assertWarns(UserWarning):
+            indicox_pred, indicoy_pred = finetune_to_indico_sequence(["ababab"], finetunex, finetuney, none_value="<PAD>", subtoken_predictions=True)
+        self.assertEqual(indicoy_pred, expectedy)
+
 
     def test_overlapping(self):
         raw = ["Indico Is the best hey"]